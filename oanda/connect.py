@@ -13,6 +13,7 @@ import json
 import pdb
 
 from oanda.config import CONFIG
+from oanda.serialize import SerWriter
 import time
 
 # create logger
@@ -168,11 +169,14 @@ class Connect(object):
                Date and time for last candle. Required
         outfile: str
                  File to write the serialized data returned
-                 by the API. Optional
+                 by the API. Candles are streamed to this file
+                 page by page and are not kept in memory. Optional
 
         Returns
         -------
-        List of dicts. Each dict contains data for a candle
+        Dict with the 'instrument', 'granularity' and the list of
+        candles ('candles'). If 'outfile' is set, then 'candles' is
+        replaced by the number of candles written ('count')
         '''
 
         startO = datetime.datetime.strptime(start, '%Y-%m-%dT%H:%M:%S')
@@ -197,31 +201,45 @@ class Connect(object):
                 delta = datetime.timedelta(minutes=int(nmins))
 
         # 5000 candles is the Oanda's limit
-        res = None
-        while startO <= endO:
-            if res is None:
-                res = self.query(startO.isoformat(), count=5000)
-            else:
-                res_l = self.query(startO.isoformat(), count=5000)
-                res['candles'] = res['candles'] + res_l['candles']
-            startO = datetime.datetime.strptime(res['candles'][-1]['time'],
-                                                '%Y-%m-%dT%H:%M:%S.%fZ')
-            if startO > endO:
-                new_list = []
-                for c in res['candles']:
-                    adtime = datetime.datetime.strptime(c['time'],
-                                                        '%Y-%m-%dT%H:%M:%S.%fZ')
-                    if adtime <= endO:
-                        new_list.append(c)
-                res['candles'] = new_list
-
-            startO = startO + delta
-
+        res = {'instrument': self.instrument,
+               'granularity': self.granularity}
+        candles = []
+        writer = None
         if outfile is not None:
-            ser_data = json.dumps(res)
-            f = open(outfile, "w")
-            f.write(ser_data)
-            f.close()
+            # each page is appended to outfile as it arrives instead
+            # of accumulating the full history in memory
+            writer = SerWriter(outfile, self.instrument, self.granularity)
+        try:
+            while startO <= endO:
+                res_l = self.query(startO.isoformat(), count=5000)
+                page = res_l['candles']
+                startO = datetime.datetime.strptime(page[-1]['time'],
+                                                    '%Y-%m-%dT%H:%M:%S.%fZ')
+                if startO > endO:
+                    new_list = []
+                    for c in page:
+                        adtime = datetime.datetime.strptime(c['time'],
+                                                            '%Y-%m-%dT%H:%M:%S.%fZ')
+                        if adtime <= endO:
+                            new_list.append(c)
+                    page = new_list
+                if writer is not None:
+                    writer.write(page)
+                else:
+                    candles.extend(page)
+
+                startO = startO + delta
+            if writer is not None:
+                writer.close()
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        if writer is not None:
+            res['count'] = writer.count
+        else:
+            res['candles'] = candles
         return res
 
     @retry()
@@ -302,10 +320,9 @@ class Connect(object):
                 else:
                     data = json.loads(resp.content.decode("utf-8"))
                     if outfile is not None:
-                        ser_data = json.dumps(data)
-                        f = open(outfile, "w")
-                        f.write(ser_data)
-                        f.close()
+                        with SerWriter(outfile, self.instrument,
+                                       self.granularity) as writer:
+                            writer.write(data['candles'])
                     return data
             except Exception as err:
                 # Something went wrong.
@@ -0,0 +1,125 @@
+'''
+@date: 19/10/2026
+@author: Ernesto Lowy
+@email: ernestolowy@gmail.com
+'''
+import json
+import os
+import stat
+
+
+class SerWriter(object):
+    """
+    Class representing an incremental writer for the serialized
+    JSON files with FOREX data. Candles are appended to a temporary
+    file as they arrive and the file is renamed to its final path
+    once the writer is closed, so a partially written file is never
+    left at 'outfile'
+
+    The resulting file has the same layout that is returned by the
+    Oanda API and that is parsed by Connect.query(indir=...). i.e.:
+    {"instrument": ..., "granularity": ..., "candles": [...]}
+    """
+    def __init__(self, outfile, instrument, granularity):
+        '''
+        Constructor
+
+        Class variables
+        ---------------
+        outfile: str
+                 Path to the final serialized file. Required
+        instrument: string
+                    Trading pair. i.e. AUD_USD. Required
+        granularity: string
+                     Timeframe. i.e. D. Required
+        count: int
+               Number of candles written so far
+        '''
+        self.outfile = outfile
+        self.instrument = instrument
+        self.granularity = granularity
+        self.count = 0
+        self.fh = None
+        self.tmpfile, fd = self.__create_tmp(outfile)
+        try:
+            # the temp file is created following the umask. Keep instead
+            # the mode of the file being replaced, if there is one
+            if os.path.exists(outfile):
+                os.chmod(self.tmpfile, stat.S_IMODE(os.stat(outfile).st_mode))
+            self.fh = os.fdopen(fd, "w")
+            self.fh.write('{{"instrument": {0}, "granularity": {1}, "candles": ['.format(
+                json.dumps(instrument), json.dumps(granularity)))
+        except BaseException:
+            if self.fh is not None:
+                self.fh.close()
+            else:
+                os.close(fd)
+            os.remove(self.tmpfile)
+            raise
+
+    def __create_tmp(self, outfile):
+        '''
+        Private function to create a new temporary file in the
+        directory of 'outfile'. The file is opened with mode 0666,
+        so the process umask is applied to it
+
+        Returns
+        -------
+        tuple with the path and the file descriptor
+        '''
+        outdir = os.path.dirname(os.path.abspath(outfile))
+        for _ in range(100):
+            tmpfile = os.path.join(outdir, ".{0}.{1}.tmp".format(os.path.basename(outfile),
+                                                                 os.urandom(4).hex()))
+            try:
+                fd = os.open(tmpfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            except FileExistsError:
+                continue
+            return tmpfile, fd
+        raise FileExistsError("No usable temporary file name found in {0}".format(outdir))
+
+    def write(self, candles):
+        '''
+        Function to append a page of candles to the output file
+
+        Parameters
+        ----------
+        candles : list of dicts
+                  Each dict contains data for a candle
+        '''
+        for c in candles:
+            if self.count > 0:
+                self.fh.write(", ")
+            json.dump(c, self.fh)
+            self.count += 1
+
+    def close(self):
+        '''
+        Function to terminate the JSON document and atomically
+        move the temporary file to 'outfile'
+        '''
+        self.fh.write("]}")
+        self.fh.close()
+        os.replace(self.tmpfile, self.outfile)
+
+    def abort(self):
+        '''
+        Function to discard the temporary file without
+        touching 'outfile'
+        '''
+        self.fh.close()
+        if os.path.exists(self.tmpfile):
+            os.remove(self.tmpfile)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def __repr__(self):
+        return "serwriter"
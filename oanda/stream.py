@@ -0,0 +1,471 @@
+'''
+@date: 19/10/2026
+@author: Ernesto Lowy
+@email: ernestolowy@gmail.com
+'''
+import datetime
+import logging
+import threading
+import time
+import collections
+import requests
+import re
+import json
+
+from zoneinfo import ZoneInfo
+from oanda.config import CONFIG
+
+# create logger
+o_logger = logging.getLogger(__name__)
+o_logger.setLevel(logging.INFO)
+
+def get_delta(granularity):
+    '''
+    Function to get the period of a given granularity
+
+    Parameters
+    ----------
+    granularity : string
+                  Timeframe. i.e. M1, M30, H4, D
+
+    Returns
+    -------
+    timedelta object
+    '''
+    if granularity == "D":
+        return datetime.timedelta(hours=24)
+    m = re.match(r'^([HM])(\d+)$', granularity)
+    if m is None:
+        raise Exception("{0} is not valid. Oanda REST service does not accept it".format(granularity))
+    n = int(m.group(2))
+    if m.group(1) == 'H' and 24 % n == 0:
+        return datetime.timedelta(hours=n)
+    elif m.group(1) == 'M' and 60 % n == 0:
+        return datetime.timedelta(minutes=n)
+    raise Exception("{0} is not valid. Oanda REST service does not accept it".format(granularity))
+
+def utcnow():
+    '''
+    Function to get the current time
+
+    :returns
+    Naive datetime object in UTC
+    '''
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def parse_time(timestr):
+    '''
+    Function to parse the time of a tick returned by the
+    streaming API (i.e. 2018-11-16T22:00:00.123456Z)
+
+    :returns
+    datetime object
+    '''
+    timestr = timestr.rstrip('Z')
+    if '.' in timestr:
+        # Oanda can return up to nanoseconds
+        base, frac = timestr.split('.')
+        timestr = "{0}.{1}".format(base, frac[:6])
+        return datetime.datetime.strptime(timestr, '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime.datetime.strptime(timestr, '%Y-%m-%dT%H:%M:%S')
+
+
+class CandleBuilder(object):
+    """
+    Class building the candles for a granularity from a sequence
+    of ticks. H and D candles start at the alignment hour of the
+    timezone set in settings.ini, so their start in UTC moves with
+    the daylight saving time (i.e. 22h in winter and 21h in summer
+    for 22h Europe/London), as the candles returned by Connect.query
+    """
+    def __init__(self, granularity, align=None, timezone=None):
+        '''
+        Constructor
+
+        Class variables
+        ---------------
+        granularity: string
+                     Timeframe. i.e. D. Required
+        align: int
+               Hour (in 'timezone') at which the daily and hourly candles
+               start. Default: hour set in settings.ini
+        timezone: str
+                  Timezone for 'align'. i.e. Europe/London.
+                  Default: timezone set in settings.ini
+        candle: dict
+                Candle in progress. None until the first tick is seen
+        '''
+        # settings.ini stores the hour in 'alignmentTimezone' and the
+        # timezone in 'dailyAlignment', so accept the values in either key
+        conf_align = CONFIG.get('oanda_api', 'alignmentTimezone', fallback='22')
+        conf_tz = CONFIG.get('oanda_api', 'dailyAlignment', fallback='Europe/London')
+        if not conf_align.isdigit():
+            conf_align, conf_tz = conf_tz, conf_align
+        self.granularity = granularity
+        self.align = int(conf_align) if align is None else align
+        self.tz = ZoneInfo(conf_tz if timezone is None else timezone)
+        self.delta = get_delta(granularity)
+        self.candle = None
+        self.__start = None
+
+    def candle_start(self, dateObj):
+        '''
+        Function to get the start time of the candle
+        containing a certain datetime
+
+        Parameters
+        ----------
+        dateObj : datetime object
+                  Naive datetime in UTC
+
+        Returns
+        -------
+        datetime object
+                 Naive datetime in UTC
+        '''
+        if self.delta < datetime.timedelta(hours=1):
+            nmins = int(self.delta.total_seconds() // 60)
+            return dateObj.replace(minute=dateObj.minute - dateObj.minute % nmins,
+                                   second=0, microsecond=0)
+        nhours = int(self.delta.total_seconds() // 3600)
+        localObj = dateObj.replace(tzinfo=datetime.timezone.utc).astimezone(self.tz)
+        offset = (localObj.hour - self.align) % nhours
+        startObj = localObj.replace(minute=0, second=0, microsecond=0) - \
+            datetime.timedelta(hours=offset)
+        return startObj.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    def update(self, tick_time, price):
+        '''
+        Function to add a tick to the candle in progress
+
+        Parameters
+        ----------
+        tick_time : datetime object
+        price : float
+                Mid price of the tick
+
+        Returns
+        -------
+        dict with the completed candle if this tick opened
+        a new one, None otherwise
+        '''
+        start = self.candle_start(tick_time)
+        completed = None
+        if self.__start is not None and start < self.__start:
+            # out-of-order tick belonging to an already completed candle
+            return None
+        if self.__start is None or start > self.__start:
+            if self.candle is not None and not self.candle['complete']:
+                completed = dict(self.candle, complete=True)
+            self.__start = start
+            self.candle = {'time': start.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                           'openMid': price,
+                           'highMid': price,
+                           'lowMid': price,
+                           'closeMid': price,
+                           'volume': 1,
+                           'complete': False}
+        else:
+            c = self.candle
+            if price > c['highMid']:
+                c['highMid'] = price
+            if price < c['lowMid']:
+                c['lowMid'] = price
+            c['closeMid'] = price
+            c['volume'] += 1
+        return completed
+
+    def expired(self, now):
+        '''
+        Function to check if the period of the candle in progress
+        is over
+
+        Parameters
+        ----------
+        now : datetime object
+              Naive datetime in UTC
+
+        Returns
+        -------
+        True if there is a candle and its period is over
+        '''
+        return self.__start is not None and now >= self.__start + self.delta
+
+    def expire(self, now):
+        '''
+        Function to complete the candle in progress if its period
+        is over. i.e. when the market closes and no more ticks arrive
+
+        Parameters
+        ----------
+        now : datetime object
+              Naive datetime in UTC
+
+        Returns
+        -------
+        dict with the completed candle or None
+        '''
+        if self.candle is None or self.candle['complete'] or not self.expired(now):
+            return None
+        self.candle['complete'] = True
+        return dict(self.candle)
+
+    def __repr__(self):
+        return "candlebuilder"
+
+
+class Stream(object):
+    """
+    Class representing a connection to the Oanda's streaming API.
+    The live ticks are kept in a bounded buffer and are used to build
+    the candles in memory, so the candle in progress can be read
+    without any REST query. The connection is reopened if it drops
+    or stalls, until 'stop' is called
+    """
+    def __init__(self, instrument, granularities=('M1', 'M5', 'M15', 'M30',
+                                                  'H1', 'H4', 'H12', 'D'),
+                 maxticks=10000, url=None, timeout=30, cooloff=5,
+                 reconnect=True):
+        '''
+        Constructor
+
+        Class variables
+        ---------------
+        instrument: string
+                    Trading pair. i.e. AUD_USD. Required
+        granularities: list
+                       Timeframes of the candles that will be built
+        maxticks: int
+                  Max number of ticks kept in 'ticks'. Default: 10000
+        url: str
+             Url of the price stream. Default: 'stream_url' in settings.ini
+        timeout: float
+                 Seconds without receiving any message (tick or heartbeat)
+                 after which the stream is considered stalled. It must be
+                 larger than the heartbeat interval. Default: 30
+        cooloff: float
+                 Seconds to wait before reconnecting. It is doubled after
+                 each failed attempt, up to 60. Default: 5
+        reconnect: bool
+                   If False, then 'run' returns when the connection is
+                   closed or fails. Default: True
+        ticks: deque
+               Last ticks received. Each tick is a dict with
+               'time', 'bid' and 'ask'
+        '''
+        self.instrument = instrument
+        self.url = url if url is not None else CONFIG.get('oanda_api', 'stream_url')
+        self.timeout = timeout
+        self.cooloff = cooloff
+        self.reconnect = reconnect
+        self.ticks = collections.deque(maxlen=maxticks)
+        self.builders = {g: CandleBuilder(g) for g in granularities}
+        self.__callbacks = []
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+        # server time of the last message, used to drop out-of-order ticks
+        self.__last_time = None
+        # time.monotonic() of the last message received
+        self.__last_msg = None
+
+    def subscribe(self, callback):
+        '''
+        Function to register a callable that will be called with
+        (granularity, candle) each time a candle is completed
+        '''
+        with self.__lock:
+            self.__callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        '''
+        Function to remove a callable registered with 'subscribe'
+        '''
+        with self.__lock:
+            self.__callbacks.remove(callback)
+
+    def candle(self, granularity):
+        '''
+        Function to get the candle in progress
+
+        Parameters
+        ----------
+        granularity : string
+                      Timeframe. i.e. D
+
+        Returns
+        -------
+        dict with the candle or None if no tick has been received yet.
+        If the period of the candle is over (i.e. the market is closed),
+        then the candle is returned with 'complete' set to True
+        '''
+        with self.__lock:
+            builder = self.builders[granularity]
+            if builder.candle is None:
+                return None
+            c = dict(builder.candle)
+            if not c['complete'] and builder.expired(utcnow()):
+                c['complete'] = True
+            return c
+
+    def last_tick(self):
+        '''
+        Function to get the last tick received
+
+        Returns
+        -------
+        dict or None if no tick has been received yet
+        '''
+        with self.__lock:
+            return self.ticks[-1] if self.ticks else None
+
+    def is_alive(self):
+        '''
+        Function to check if the stream is live, i.e. a message (tick
+        or heartbeat) was received in the last 'timeout' seconds
+        '''
+        last_msg = self.__last_msg
+        return last_msg is not None and time.monotonic() - last_msg < self.timeout
+
+    def process(self, line):
+        '''
+        Function to process a line returned by the price stream.
+        Ticks older than the last message are dropped and heartbeats
+        are used to complete the candles whose period is over
+
+        Parameters
+        ----------
+        line : str or bytes
+               JSON message. i.e. {"tick": {"instrument": "AUD_USD",
+               "time": "...", "bid": 0.72, "ask": 0.7201}}
+        '''
+        if not line:
+            return
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        msg = json.loads(line)
+        self.__last_msg = time.monotonic()
+        if 'heartbeat' in msg:
+            msg_time = parse_time(msg['heartbeat']['time'])
+            tick = None
+        elif 'tick' in msg:
+            tick = msg['tick']
+            if tick.get('instrument', self.instrument) != self.instrument:
+                return
+            msg_time = parse_time(tick['time'])
+        else:
+            return
+        completed = []
+        with self.__lock:
+            if self.__last_time is not None and msg_time < self.__last_time:
+                return
+            self.__last_time = msg_time
+            if tick is None:
+                for g, builder in self.builders.items():
+                    c = builder.expire(msg_time)
+                    if c is not None:
+                        completed.append((g, c))
+            else:
+                price = (tick['bid'] + tick['ask']) / 2
+                self.ticks.append({'time': msg_time,
+                                   'bid': tick['bid'],
+                                   'ask': tick['ask']})
+                for g, builder in self.builders.items():
+                    c = builder.update(msg_time, price)
+                    if c is not None:
+                        completed.append((g, c))
+            callbacks = list(self.__callbacks)
+        # callbacks are run outside the lock so they can read the candles
+        for g, c in completed:
+            for callback in callbacks:
+                try:
+                    callback(g, c)
+                except Exception:
+                    o_logger.exception("Subscriber {0} failed with the {1} candle "
+                                       "at {2}".format(callback, g, c['time']))
+
+    def run(self):
+        '''
+        Function to consume the price stream until 'stop' is called.
+        If the connection fails, is closed or no message is received
+        for 'timeout' seconds, then it is reopened after 'cooloff'
+        seconds (or 'run' returns if 'reconnect' is False)
+        '''
+        cooloff = self.cooloff
+        while not self.__stop.is_set():
+            if self.__consume():
+                cooloff = self.cooloff
+            if not self.reconnect or self.__stop.is_set():
+                break
+            o_logger.info("Reconnecting stream for {0} in {1}s".format(self.instrument,
+                                                                      cooloff))
+            self.__stop.wait(cooloff)
+            cooloff = min(cooloff * 2, 60)
+        o_logger.debug("Stream for {0} closed".format(self.instrument))
+
+    def __consume(self):
+        '''
+        Private function to open a connection to the price stream
+        and process its messages until it is closed or fails
+
+        Returns
+        -------
+        True if at least one message was received
+        '''
+        params = {'instruments': self.instrument}
+        received = False
+        try:
+            resp = requests.get(url=self.url, params=params, stream=True,
+                                timeout=self.timeout)
+        except requests.exceptions.RequestException as err:
+            o_logger.warning("Stream for {0} failed to connect: {1}".format(self.instrument, err))
+            return received
+        try:
+            if resp.status_code != 200:
+                o_logger.warning("Stream for {0} returned {1}".format(self.instrument,
+                                                                     resp.status_code))
+                return received
+            for line in resp.iter_lines():
+                if self.__stop.is_set():
+                    break
+                try:
+                    self.process(line)
+                    received = True
+                except (ValueError, KeyError, TypeError):
+                    o_logger.exception("Malformed message in stream for {0}: {1}".format(
+                        self.instrument, line))
+        except requests.exceptions.RequestException as err:
+            # a read timeout while streaming is raised as a ConnectionError
+            o_logger.warning("Stream for {0} stalled: {1}".format(self.instrument, err))
+        finally:
+            resp.close()
+        return received
+
+    def start(self):
+        '''
+        Function to consume the price stream in a background thread
+        '''
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.run, daemon=True)
+        self.__thread.start()
+        return self.__thread
+
+    def stop(self, timeout=None):
+        '''
+        Function to stop the background thread started by 'start'.
+        The thread exits when the next message (tick or heartbeat)
+        is received, while it waits to reconnect or, at the latest,
+        after 'timeout' seconds without messages
+        '''
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    def __repr__(self):
+        return "stream"
+
+    def __str__(self):
+        out_str = ""
+        for attr, value in self.__dict__.items():
+            out_str += "%s:%s " % (attr, value)
+        return out_str
@@ -140,3 +140,50 @@ def test_query_M30():
     respl = conn.query(start='2018-05-21T21:00:00',
                        end='2018-05-23T21:00:00')
     assert len(respl['candles']) == 97
+
+def fake_pages(days):
+    '''
+    Generate the pages returned by a mocked 'query'. 'days' is a list
+    of lists, each of them with the days of November 2018 in a page
+    '''
+    return [{'instrument': 'AUD_USD',
+             'granularity': 'D',
+             'candles': [{'time': '2018-11-{0:02d}T22:00:00.000000Z'.format(d),
+                          'closeMid': 0.72, 'complete': True} for d in page]}
+            for page in days]
+
+def test_mquery_outfile(conn_o, monkeypatch, tmp_path):
+    log = logging.getLogger('test_mquery_outfile')
+    log.debug('Test for \'mquery\' function streaming the pages into \'outfile\'')
+    pages = fake_pages([[12, 13, 14], [15, 16, 19, 20, 21, 22]])
+    monkeypatch.setattr(Connect, 'query', lambda self, start, **kwargs: pages.pop(0))
+    outfile = str(tmp_path / "AUD_USD.D.2018.ser")
+    res = conn_o.mquery(start='2018-11-12T22:00:00',
+                        end='2018-11-21T22:00:00',
+                        outfile=outfile)
+    # last page is trimmed to 'end'
+    assert res['count'] == 8
+    assert 'candles' not in res
+    assert os.listdir(str(tmp_path)) == ["AUD_USD.D.2018.ser"]
+    monkeypatch.undo()
+    res_in = conn_o.query(start='2018-11-12T22:00:00', end='2018-11-21T22:00:00',
+                          indir=str(tmp_path))
+    assert len(res_in['candles']) == 8
+    assert res_in['candles'][-1]['time'] == '2018-11-21T22:00:00.000000Z'
+
+def test_mquery_outfile_fail(conn_o, monkeypatch, tmp_path):
+    log = logging.getLogger('test_mquery_outfile_fail')
+    log.debug('Test for \'mquery\' function leaving no file when a page fails')
+    pages = fake_pages([[12, 13, 14]])
+
+    def query(self, start, **kwargs):
+        if not pages:
+            raise Exception(500)
+        return pages.pop(0)
+
+    monkeypatch.setattr(Connect, 'query', query)
+    with pytest.raises(Exception):
+        conn_o.mquery(start='2018-11-12T22:00:00',
+                      end='2018-11-21T22:00:00',
+                      outfile=str(tmp_path / "AUD_USD.D.2018.ser"))
+    assert os.listdir(str(tmp_path)) == []
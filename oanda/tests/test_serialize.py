@@ -0,0 +1,80 @@
+import pytest
+import logging
+import json
+import os
+import stat
+
+from oanda.serialize import SerWriter
+
+@pytest.fixture
+def candles():
+    return [{'time': '2018-11-16T22:00:00.000000Z', 'openMid': 0.72, 'closeMid': 0.73},
+            {'time': '2018-11-19T22:00:00.000000Z', 'openMid': 0.73, 'closeMid': 0.72},
+            {'time': '2018-11-20T22:00:00.000000Z', 'openMid': 0.72, 'closeMid': 0.71}]
+
+def test_write_pages(tmp_path, candles):
+    log = logging.getLogger('test_write_pages')
+    log.debug('Test for \'SerWriter\' appending several pages of candles')
+    outfile = str(tmp_path / "AUD_USD.D.2018.ser")
+    with SerWriter(outfile, 'AUD_USD', 'D') as writer:
+        writer.write(candles[:2])
+        writer.write([])
+        writer.write(candles[2:])
+    assert writer.count == 3
+    with open(outfile) as f:
+        parsed_json = json.load(f)
+    assert parsed_json['instrument'] == 'AUD_USD'
+    assert parsed_json['granularity'] == 'D'
+    assert parsed_json['candles'] == candles
+    assert os.listdir(str(tmp_path)) == ["AUD_USD.D.2018.ser"]
+
+def test_write_empty(tmp_path):
+    log = logging.getLogger('test_write_empty')
+    log.debug('Test for \'SerWriter\' without candles')
+    outfile = str(tmp_path / "ser.dmp")
+    with SerWriter(outfile, 'AUD_USD', 'D'):
+        pass
+    with open(outfile) as f:
+        assert json.load(f)['candles'] == []
+
+def test_write_abort(tmp_path, candles):
+    log = logging.getLogger('test_write_abort')
+    log.debug('Test for \'SerWriter\' leaving no file behind when writing fails')
+    outfile = str(tmp_path / "ser.dmp")
+    with pytest.raises(ValueError):
+        with SerWriter(outfile, 'AUD_USD', 'D') as writer:
+            writer.write(candles)
+            raise ValueError("failed page")
+    assert os.listdir(str(tmp_path)) == []
+
+def test_write_mode(tmp_path, candles):
+    log = logging.getLogger('test_write_mode')
+    log.debug('Test for \'SerWriter\' creating files with the umask mode'
+              ' and keeping the mode of a replaced file')
+    outfile = str(tmp_path / "ser.dmp")
+    umask = os.umask(0o022)
+    try:
+        with SerWriter(outfile, 'AUD_USD', 'D') as writer:
+            writer.write(candles)
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(outfile).st_mode) == 0o644
+    os.chmod(outfile, 0o640)
+    with SerWriter(outfile, 'AUD_USD', 'D') as writer:
+        writer.write(candles)
+    assert stat.S_IMODE(os.stat(outfile).st_mode) == 0o640
+
+def test_write_setup_fail(tmp_path, monkeypatch):
+    log = logging.getLogger('test_write_setup_fail')
+    log.debug('Test for \'SerWriter\' removing the temporary file when the setup fails')
+    outfile = str(tmp_path / "ser.dmp")
+    with open(outfile, "w") as f:
+        f.write("{}")
+
+    def chmod(path, mode):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(os, 'chmod', chmod)
+    with pytest.raises(PermissionError):
+        SerWriter(outfile, 'AUD_USD', 'D')
+    assert os.listdir(str(tmp_path)) == ["ser.dmp"]
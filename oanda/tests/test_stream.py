@@ -0,0 +1,319 @@
+import pytest
+import logging
+import threading
+import json
+import datetime
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from oanda.stream import Stream, CandleBuilder
+
+TICKS = [('2018-11-16T21:59:30.000000Z', 0.7200, 0.7202),
+         ('2018-11-16T22:00:10.000000Z', 0.7210, 0.7212),
+         ('2018-11-16T22:00:50.000000Z', 0.7190, 0.7192),
+         ('2018-11-16T22:01:05.000000Z', 0.7220, 0.7222)]
+
+def tick(t, bid, ask, instrument='AUD_USD'):
+    return json.dumps({'tick': {'instrument': instrument, 'time': t,
+                                'bid': bid, 'ask': ask}})
+
+def heartbeat(t):
+    return json.dumps({'heartbeat': {'time': t}})
+
+class PriceHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Oanda's streaming API. It sends
+    a heartbeat and TICKS and closes the stream
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.start_stream()
+        self.send(heartbeat(TICKS[0][0]))
+        for t, b, a in TICKS:
+            self.send(tick(t, b, a))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def send(self, msg):
+        data = (msg + "\n").encode("utf-8")
+        self.wfile.write("{0:x}\r\n".format(len(data)).encode("utf-8") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_heartbeats(self, n=200):
+        for i in range(n):
+            self.send(heartbeat(TICKS[-1][0]))
+            time.sleep(0.05)
+
+    def log_message(self, format, *args):
+        pass
+
+class HeartbeatHandler(PriceHandler):
+    """
+    Stand-in sending TICKS and then a heartbeat every 50ms
+    until the client disconnects
+    """
+    def do_GET(self):
+        self.start_stream()
+        try:
+            for t, b, a in TICKS:
+                self.send(tick(t, b, a))
+            self.send_heartbeats()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class StalledHandler(PriceHandler):
+    """
+    Stand-in sending one tick and then going quiet
+    without closing the connection
+    """
+    def do_GET(self):
+        self.start_stream()
+        try:
+            self.send(tick(*TICKS[0]))
+            time.sleep(3)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class ReconnectHandler(PriceHandler):
+    """
+    Stand-in answering 503 to the first connection, closing the second
+    one after two ticks and sending the rest of TICKS in the third one
+    """
+    connections = 0
+
+    def do_GET(self):
+        ReconnectHandler.connections += 1
+        if ReconnectHandler.connections == 1:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.start_stream()
+        try:
+            if ReconnectHandler.connections == 2:
+                self.send("not json")
+                for t, b, a in TICKS[:2]:
+                    self.send(tick(t, b, a))
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                for t, b, a in TICKS[2:]:
+                    self.send(tick(t, b, a))
+                self.send_heartbeats()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+@pytest.fixture
+def price_server(request):
+    handler = getattr(request, 'param', PriceHandler)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{0}/v1/prices".format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+@pytest.mark.parametrize("g,t,s", [('M1', '2018-11-16T22:00:50', '2018-11-16T22:00:00'),
+                                   ('M5', '2018-11-16T22:07:50', '2018-11-16T22:05:00'),
+                                   ('H1', '2018-11-16T22:30:00', '2018-11-16T22:00:00'),
+                                   ('H4', '2018-11-17T01:30:00', '2018-11-16T22:00:00'),
+                                   ('H12', '2018-11-17T09:59:00', '2018-11-16T22:00:00'),
+                                   ('H12', '2018-11-17T10:00:00', '2018-11-17T10:00:00'),
+                                   ('D', '2018-11-16T21:59:00', '2018-11-15T22:00:00'),
+                                   ('D', '2018-11-16T22:00:00', '2018-11-16T22:00:00'),
+                                   # Summer time. Candles start at 21h UTC
+                                   ('D', '2019-07-01T21:10:00', '2019-07-01T21:00:00'),
+                                   ('D', '2019-07-01T20:59:00', '2019-06-30T21:00:00'),
+                                   ('H4', '2019-07-01T21:50:00', '2019-07-01T21:00:00'),
+                                   ('H12', '2019-07-02T09:30:00', '2019-07-02T09:00:00'),
+                                   ('H1', '2019-07-01T21:50:00', '2019-07-01T21:00:00'),
+                                   ('M30', '2019-07-01T21:50:00', '2019-07-01T21:30:00')])
+def test_candle_start(g, t, s):
+    log = logging.getLogger('test_candle_start')
+    log.debug('Test for \'candle_start\' function with different granularities')
+    builder = CandleBuilder(g, align=22, timezone='Europe/London')
+    res = builder.candle_start(datetime.datetime.strptime(t, '%Y-%m-%dT%H:%M:%S'))
+    assert res.isoformat() == s
+
+def test_stream(price_server, monkeypatch):
+    log = logging.getLogger('test_stream')
+    log.debug('Test for \'Stream\' building candles from a local price stream')
+    monkeypatch.setattr('oanda.stream.utcnow',
+                        lambda: datetime.datetime(2018, 11, 16, 22, 1, 30))
+    stream = Stream(instrument='AUD_USD', granularities=['M1', 'D'],
+                    maxticks=2, url=price_server, reconnect=False)
+    completed = []
+    stream.subscribe(lambda g, c: completed.append((g, c)))
+    stream.run()
+
+    assert len(stream.ticks) == 2
+    assert stream.last_tick()['bid'] == 0.7220
+    assert [(g, c['time']) for g, c in completed] == \
+        [('M1', '2018-11-16T21:59:00.000000Z'),
+         ('D', '2018-11-15T22:00:00.000000Z'),
+         ('M1', '2018-11-16T22:00:00.000000Z')]
+    assert completed[2][1]['volume'] == 2
+    assert completed[2][1]['complete'] is True
+
+    m1 = stream.candle('M1')
+    assert m1['time'] == '2018-11-16T22:01:00.000000Z'
+    assert m1['complete'] is False
+    d = stream.candle('D')
+    assert d['time'] == '2018-11-16T22:00:00.000000Z'
+    assert d['openMid'] == pytest.approx(0.7211)
+    assert d['highMid'] == pytest.approx(0.7221)
+    assert d['lowMid'] == pytest.approx(0.7191)
+    assert d['closeMid'] == pytest.approx(0.7221)
+    assert d['volume'] == 3
+
+def test_process_summer():
+    log = logging.getLogger('test_process_summer')
+    log.debug('Test for \'process\' function aligning the candles in summer time')
+    stream = Stream(instrument='AUD_USD', granularities=['H4', 'D'], url='')
+    stream.process(tick('2019-07-01T20:50:00.000000Z', 0.6990, 0.6992))
+    stream.process(tick('2019-07-01T21:10:00.000000Z', 0.7000, 0.7002))
+    stream.process(tick('2019-07-01T21:50:00.000000Z', 0.7010, 0.7012))
+    for g in ('H4', 'D'):
+        c = stream.candle(g)
+        assert c['time'] == '2019-07-01T21:00:00.000000Z'
+        assert c['volume'] == 2
+
+def test_process_ignored(monkeypatch):
+    log = logging.getLogger('test_process_ignored')
+    log.debug('Test for \'process\' function ignoring heartbeats, ticks for other'
+              ' instruments and out-of-order ticks in all the granularities')
+    monkeypatch.setattr('oanda.stream.utcnow',
+                        lambda: datetime.datetime(2018, 11, 16, 22, 1, 30))
+    stream = Stream(instrument='AUD_USD', granularities=['M1', 'D'], url='')
+    completed = []
+    stream.subscribe(lambda g, c: completed.append((g, c)))
+    stream.process(tick('2018-11-16T22:01:05.000000Z', 0.7220, 0.7222))
+    stream.process(heartbeat('2018-11-16T22:01:06.000000Z'))
+    stream.process(b'')
+    stream.process(tick('2018-11-16T22:01:10.000000Z', 0.9000, 0.9002, instrument='EUR_USD'))
+    # late tick in the same D candle and in a previous M1 candle
+    stream.process(tick('2018-11-16T22:00:50.000000Z', 0.7000, 0.7002))
+    for g in ('M1', 'D'):
+        c = stream.candle(g)
+        assert c['volume'] == 1
+        assert c['highMid'] == pytest.approx(0.7221)
+        assert c['lowMid'] == pytest.approx(0.7221)
+        assert c['closeMid'] == pytest.approx(0.7221)
+        assert c['complete'] is False
+    assert len(stream.ticks) == 1
+    assert stream.last_tick()['bid'] == 0.7220
+    assert completed == []
+
+def test_expired_candle(monkeypatch):
+    log = logging.getLogger('test_expired_candle')
+    log.debug('Test for \'candle\' and \'process\' functions completing the candles'
+              ' whose period is over')
+    now = [datetime.datetime(2018, 11, 16, 22, 0, 30)]
+    monkeypatch.setattr('oanda.stream.utcnow', lambda: now[0])
+    stream = Stream(instrument='AUD_USD', granularities=['M1', 'D'], url='')
+    completed = []
+    stream.subscribe(lambda g, c: completed.append((g, c)))
+    stream.process(tick('2018-11-16T22:00:10.000000Z', 0.7210, 0.7212))
+    assert stream.candle('M1')['complete'] is False
+    # market closed. No more ticks for this minute
+    now[0] = datetime.datetime(2018, 11, 16, 22, 5, 0)
+    assert stream.candle('M1')['complete'] is True
+    assert stream.candle('D')['complete'] is False
+    assert completed == []
+    # the heartbeats complete the candle for the subscribers
+    stream.process(heartbeat('2018-11-16T22:00:59.000000Z'))
+    assert completed == []
+    stream.process(heartbeat('2018-11-16T22:01:00.000000Z'))
+    assert [(g, c['time'], c['complete']) for g, c in completed] == \
+        [('M1', '2018-11-16T22:00:00.000000Z', True)]
+    stream.process(heartbeat('2018-11-16T22:02:00.000000Z'))
+    # the next tick does not notify the same candle again
+    stream.process(tick('2018-11-16T22:03:10.000000Z', 0.7220, 0.7222))
+    assert len(completed) == 1
+    assert stream.candle('M1')['time'] == '2018-11-16T22:03:00.000000Z'
+    assert stream.candle('D')['volume'] == 2
+
+def test_unsubscribe():
+    log = logging.getLogger('test_unsubscribe')
+    log.debug('Test for \'unsubscribe\' function')
+    stream = Stream(instrument='AUD_USD', granularities=['M1'], url='')
+    completed = []
+    callback = lambda g, c: completed.append((g, c))
+    stream.subscribe(callback)
+    stream.process(tick('2018-11-16T22:00:10.000000Z', 0.7210, 0.7212))
+    stream.process(tick('2018-11-16T22:01:05.000000Z', 0.7220, 0.7222))
+    assert len(completed) == 1
+    stream.unsubscribe(callback)
+    stream.process(tick('2018-11-16T22:02:05.000000Z', 0.7230, 0.7232))
+    assert len(completed) == 1
+
+def test_subscriber_error(caplog):
+    log = logging.getLogger('test_subscriber_error')
+    log.debug('Test for \'process\' function logging a failing subscriber')
+    stream = Stream(instrument='AUD_USD', granularities=['M1'], url='')
+    completed = []
+
+    def failing(g, c):
+        raise ValueError("bad subscriber")
+
+    stream.subscribe(failing)
+    stream.subscribe(lambda g, c: completed.append((g, c)))
+    stream.process(tick('2018-11-16T22:00:10.000000Z', 0.7210, 0.7212))
+    stream.process(tick('2018-11-16T22:01:05.000000Z', 0.7220, 0.7222))
+    assert len(completed) == 1
+    assert stream.candle('M1')['time'] == '2018-11-16T22:01:00.000000Z'
+    assert "bad subscriber" in caplog.text
+
+@pytest.mark.parametrize('price_server', [HeartbeatHandler], indirect=True)
+def test_start_stop(price_server):
+    log = logging.getLogger('test_start_stop')
+    log.debug('Test for \'start\' and \'stop\' functions with a background thread')
+    stream = Stream(instrument='AUD_USD', granularities=['M1'], url=price_server, timeout=5)
+    assert not stream.is_alive()
+    thread = stream.start()
+    wait_for(lambda: stream.last_tick() is not None and stream.last_tick()['bid'] == 0.7220)
+    assert stream.candle('M1')['time'] == '2018-11-16T22:01:00.000000Z'
+    assert stream.is_alive()
+    stream.stop(timeout=5)
+    assert not thread.is_alive()
+
+@pytest.mark.parametrize('price_server', [StalledHandler], indirect=True)
+def test_stalled(price_server):
+    log = logging.getLogger('test_stalled')
+    log.debug('Test for \'run\' function returning when the stream goes quiet')
+    stream = Stream(instrument='AUD_USD', granularities=['M1'], url=price_server,
+                    timeout=0.5, reconnect=False)
+    begin = time.time()
+    stream.run()
+    assert time.time() - begin < 2.5
+    assert len(stream.ticks) == 1
+    assert not stream.is_alive()
+
+@pytest.mark.parametrize('price_server', [ReconnectHandler], indirect=True)
+def test_reconnect(price_server, caplog):
+    log = logging.getLogger('test_reconnect')
+    log.debug('Test for \'run\' function reconnecting after an error status,'
+              ' a malformed message and a closed connection')
+    ReconnectHandler.connections = 0
+    stream = Stream(instrument='AUD_USD', granularities=['M1'], url=price_server,
+                    timeout=5, cooloff=0.05)
+    thread = stream.start()
+    wait_for(lambda: stream.last_tick() is not None and stream.last_tick()['bid'] == 0.7220)
+    assert ReconnectHandler.connections == 3
+    assert len(stream.ticks) == 4
+    assert stream.candle('M1')['volume'] == 1
+    assert "returned 503" in caplog.text
+    assert "Malformed message" in caplog.text
+    stream.stop(timeout=5)
+    assert not thread.is_alive()